@@ -3,51 +3,24 @@
 # Uses Ollama locally, switches to Groq when deployed to the cloud
 
 import streamlit as st
+import hashlib
 import os
-from crew import ResearchCrew
+from functools import lru_cache
+from providers import get_provider
+from transcript_render import StreamingMarkdown
 
 
 # Generates Material Icon HTML for cleaner UI elements
+# Pure function of its args and called a handful of times per rerun, so the
+# memo turns repeat calls into a dict lookup
+@lru_cache(maxsize=64)
 def icon(name, size="18px"):
     return f'<span class="material-icons" style="font-size:{size};vertical-align:middle;margin-right:6px;">{name}</span>'
 
 
-# Check if we're running on the cloud or locally
-# If there's a Groq API key in secrets, we're on the cloud
-if "GROQ_API_KEY" in st.secrets:
-    env_mode = "Cloud"
-    api_key = st.secrets["GROQ_API_KEY"]
-    
-    # Current working Groq models (Jan 2026)
-    model_options = {
-        "groq/llama-3.3-70b-versatile": "Best Quality",
-        "groq/llama-3.1-8b-instant": "Fastest"
-    }
-    
-    # Set the env var so litellm can find it
-    os.environ["GROQ_API_KEY"] = api_key
-else:
-    env_mode = "Local"
-    api_key = None
-    
-    # Ollama models with litellm prefix
-    model_options = {
-        "ollama/deepseek-r1:8b": "DeepSeek R1 8B",
-        "ollama/llama3.2": "Llama 3.2",
-        "ollama/mistral": "Mistral"
-    }
-
-
-# Set up the page
-st.set_page_config(
-    page_title="Deep Research Agent", 
-    page_icon=None,
-    layout="centered"
-)
-
-
-# Custom CSS for styling
-st.markdown("""
+# Page chrome, built once at import time
+# Served through st.html, which skips the frontend markdown parser entirely
+_PAGE_CSS = """
 <link href="https://fonts.googleapis.com/icon?family=Material+Icons" rel="stylesheet">
 <style>
     .stAppDeployButton {display: none;}
@@ -56,11 +29,80 @@ st.markdown("""
     .stMarkdown {padding: 20px; border-radius: 10px;}
     .icon-text {display: flex; align-items: center;}
 </style>
-""", unsafe_allow_html=True)
+"""
+
+_HEADER_HTML = f'<h1>{icon("policy", "32px")} Deep Research Agent</h1>'
+
+
+# Re-running an identical query is common (comparing models, re-downloading
+# a report), so completed reports are cached to disk for a day
+# The API key is keyed by hash only - the real key is read back from the
+# environment - and the underscore on _placeholder tells Streamlit not to
+# hash the render slot
+@st.cache_data(persist="disk", ttl=86400, show_spinner=False)
+def _run_cached(topic, model_name, temperature, api_key_hash):
+    # Deferred import: crew pulls in litellm and friends, easily seconds of
+    # import time we'd otherwise pay before the first widget renders
+    # Python caches the module, so runs after the first are free
+    from crew import ResearchCrew
+
+    # The live-preview slot must be created in here: st.cache_data replays a
+    # hit's element calls, and replay rejects elements that live on a block
+    # created outside the cached function
+    placeholder = StreamingMarkdown(st.empty())
+
+    crew = ResearchCrew(
+        topic=topic,
+        model_name=model_name,
+        temperature=temperature,
+        api_key=os.environ.get("GROQ_API_KEY")
+    )
+    return str(crew.run(placeholder=placeholder))
+
+
+# Ask Ollama to pull the selected model into memory before the user hits
+# Launch - a cold model otherwise pays its multi-second load inside the run
+# Keyed on the model, so changing the dropdown warms the new choice once
+@st.cache_resource
+def warmup(model_name):
+    import httpx
+    try:
+        # Empty prompt loads weights without generating; keep_alive=-1 pins
+        # them resident. The short timeout just stops us blocking the script -
+        # Ollama keeps loading after we stop waiting
+        httpx.post(
+            "http://localhost:11434/api/generate",
+            json={
+                "model": model_name.removeprefix("ollama/"),
+                "prompt": "",
+                "keep_alive": -1
+            },
+            timeout=2
+        )
+    except Exception:
+        # Best effort - the run itself will load the model if this didn't
+        pass
+    return True
+
+
+# Cloud (Groq) or local (Ollama), decided by what's in Streamlit secrets
+env_mode, api_key, model_options = get_provider()
+
+
+# Set up the page
+st.set_page_config(
+    page_title="Deep Research Agent", 
+    page_icon=None,
+    layout="centered"
+)
 
 
-# Header
-st.markdown(f'<h1>{icon("policy", "32px")} Deep Research Agent</h1>', unsafe_allow_html=True)
+# Custom CSS for styling and header
+# Emitted every run on purpose: Streamlit drops elements that aren't
+# re-emitted, so a guarded one-shot injection would lose the styling (and
+# the Material Icons font) on the first rerun
+st.html(_PAGE_CSS)
+st.html(_HEADER_HTML)
 st.markdown("Pick a topic, hit the button, and let the AI do the digging for you.")
 
 
@@ -74,7 +116,12 @@ with st.sidebar:
         format_func=lambda x: model_options[x],
         index=0
     )
-    
+
+    # Warm the model as soon as it's picked so weights are resident by the
+    # time the user clicks Launch
+    if env_mode == "Local":
+        warmup(selected_model)
+
     temperature = st.slider(
         "Creativity Level", 
         0.0, 1.0, 0.7, 
@@ -95,31 +142,42 @@ if run_btn:
     with st.status("**Agents are working...**", expanded=True) as status:
         try:
             st.markdown(f'{icon("search")} Researcher Agent is gathering data...', unsafe_allow_html=True)
-            
-            crew = ResearchCrew(
-                topic=topic, 
-                model_name=selected_model, 
-                temperature=temperature,
-                api_key=api_key
-            )
-            
             st.markdown(f'{icon("edit_note")} Writer Agent is drafting the content...', unsafe_allow_html=True)
-            
-            result = crew.run()
+
+            key_hash = hashlib.sha256(api_key.encode()).hexdigest() if api_key else ""
+            result = _run_cached(topic, selected_model, temperature, key_hash)
             
             status.update(label="Research Complete!", state="complete", expanded=False)
-            
-            st.markdown("---")
-            st.markdown(f'<h3>{icon("article", "24px")} Report: {topic}</h3>', unsafe_allow_html=True)
-            st.markdown(result)
-            
-            st.download_button(
-                label="Download Report",
-                data=str(result),
-                file_name=f"{topic.replace(' ', '_')}_report.md",
-                mime="text/markdown"
-            )
+
+            # Serialize once - later reruns reuse these instead of walking the
+            # result object again on every widget interaction
+            st.session_state["report_topic"] = topic
+            st.session_state["report_md"] = result
+            st.session_state["report_bytes"] = result.encode("utf-8")
 
         except Exception as e:
             status.update(label="Error Occurred", state="error")
             st.error(f"An error occurred: {e}")
+
+
+# Show the finished report outside the button guard so it survives reruns
+# without re-running or re-serializing anything
+# As a fragment it reruns in isolation, so slider drags and dropdown changes
+# elsewhere on the page no longer re-ship and re-parse the whole report
+@st.fragment
+def render_report():
+    report_topic = st.session_state["report_topic"]
+    st.markdown("---")
+    st.markdown(f'<h3>{icon("article", "24px")} Report: {report_topic}</h3>', unsafe_allow_html=True)
+    st.markdown(st.session_state["report_md"])
+
+    st.download_button(
+        label="Download Report",
+        data=st.session_state["report_bytes"],
+        file_name=f"{report_topic.replace(' ', '_')}_report.md",
+        mime="text/markdown"
+    )
+
+
+if "report_md" in st.session_state:
+    render_report()
@@ -1,106 +1,219 @@
 # Research Crew
-# Sets up the AI research team using CrewAI
+# Runs the research workflow as two pipelined litellm streams
 # One agent digs up facts, another writes them up nicely
 
-from crewai import Agent, Task, Crew, Process, LLM
+import asyncio
+import json
+import time
 
+import httpx
+import litellm
+
+# Response cache: an identical (model, messages, temperature) request is
+# served straight from disk - no prefill, no decode
+# Catches repeated sub-prompts across topics and agent retries that the
+# report-level cache in app.py never sees
+litellm.cache = litellm.Cache(type="disk", disk_cache_dir=".litellm_cache")
+
+# Agent personas as module constants, with no topic interpolation
+# Keeping these byte-identical across calls and reruns (topic lives in the
+# user message only) lets Groq and llama.cpp/Ollama reuse the prompt KV cache
+# for the prefix instead of re-running prefill every time
+RESEARCHER_SYSTEM = (
+    "You are a Senior Research Analyst, a world-class researcher known for producing "
+    "thorough, well-structured reports. You dig deep into topics, exploring multiple "
+    "angles, statistics, examples, and expert opinions. You never skim the surface - "
+    "you provide substantive analysis with specific details, data points, and concrete "
+    "examples. You cite sources when possible and distinguish between established "
+    "facts and emerging trends."
+)
+
+WRITER_SYSTEM = (
+    "You are a Tech Content Strategist, an expert technical writer who excels at "
+    "making complex topics accessible without dumbing them down. You preserve "
+    "important details and nuances from research while organizing them into clear "
+    "sections. You use specific examples, statistics, and concrete details - never "
+    "vague generalizations. Your writing is information-dense but scannable, with "
+    "clear headers and logical flow."
+)
+
+# Minimum gap between live-preview re-renders (seconds)
+# Every render re-parses the whole buffer as markdown, so rendering on each
+# token delta gets quadratic fast - coalesce bursts into ~10 renders/sec
+RENDER_INTERVAL = 0.1
 
 class ResearchCrew:
-    # Runs a two-agent workflow: researcher finds info, writer makes it readable
+    # Researcher finds info, writer makes it readable
     # Works with both local Ollama and cloud Groq
-    
+    # The research brief and the article outline don't depend on each other,
+    # so both prompts are issued concurrently (the provider's continuous
+    # batcher amortizes them into shared forward passes); a final writer pass
+    # then merges brief and outline into the article
+
     def __init__(self, topic, model_name, temperature=0.7, api_key=None):
         self.topic = topic
-        
-        # CrewAI's LLM class uses litellm under the hood
-        # Model names include the provider prefix (groq/, ollama/) for routing
-        self.llm = LLM(
-            model=model_name,
-            api_key=api_key,
-            temperature=temperature
-        )
-    
-    def run(self):
-        # Create the researcher agent - thorough, detailed, fact-focused
-        researcher = Agent(
-            role='Senior Research Analyst',
-            goal=f'Produce an extremely detailed and comprehensive research brief on {self.topic}',
-            backstory=(
-                f"You are a world-class research analyst known for producing thorough, "
-                f"well-structured reports. You dig deep into topics, exploring multiple angles, "
-                f"statistics, examples, and expert opinions. You never skim the surface - you "
-                f"provide substantive analysis with specific details, data points, and concrete examples. "
-                f"You cite sources when possible and distinguish between established facts and emerging trends."
-            ),
-            verbose=True,
-            llm=self.llm 
+        self.model_name = model_name
+        self.temperature = temperature
+        self.api_key = api_key
+
+    def _completion(self, messages, temperature=None, json_mode=False):
+        # litellm routes on the model prefix (groq/, ollama/) same as before,
+        # and maps response_format onto Ollama's grammar-constrained json mode
+        kwargs = {}
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+        return litellm.acompletion(
+            model=self.model_name,
+            messages=messages,
+            temperature=self.temperature if temperature is None else temperature,
+            api_key=self.api_key,
+            stream=True,
+            **kwargs
         )
 
-        # Create the writer agent - transforms research into polished content
-        writer = Agent(
-            role='Tech Content Strategist',
-            goal=f"Transform research into a comprehensive, well-organized article that maintains depth while being readable",
-            backstory=(
-                f"You are an expert technical writer who excels at making complex topics accessible "
-                f"without dumbing them down. You preserve important details and nuances from research "
-                f"while organizing them into clear sections. You use specific examples, statistics, "
-                f"and concrete details - never vague generalizations. Your writing is information-dense "
-                f"but scannable, with clear headers and logical flow."
-            ),
-            verbose=True,
-            llm=self.llm
+    def _researcher_messages(self):
+        # Compact JSON instead of a freeform 800-word brief: decode cost is
+        # linear in output tokens and the writer regenerates the prose anyway,
+        # so only the facts themselves need to cross the wire
+        user = (
+            f"Conduct an in-depth analysis of {self.topic}. Return your findings as compact "
+            f"JSON only, no prose, using this schema:\n"
+            f'{{"sections": [{{"header": str, "bullets": [str, ...], "stats": [str, ...]}}]}}\n\n'
+            f"Cover these angles, one section each:\n"
+            f"1. Background and context - what is this and why does it matter?\n"
+            f"2. Current state - specific examples, companies, or projects.\n"
+            f"3. Key statistics and data points - numbers, percentages, growth rates.\n"
+            f"4. Major players and stakeholders - who's involved and what are they doing?\n"
+            f"5. Challenges and controversies - what are the problems or debates?\n"
+            f"6. Future outlook - where is this heading in the next 1-3 years?\n"
+            f"7. Expert opinions or notable quotes if available.\n\n"
+            f"Be specific - concrete examples and numbers, not vague statements. Keep each "
+            f"bullet under 20 words. Focus on information from 2024-2026."
         )
+        return [
+            {"role": "system", "content": RESEARCHER_SYSTEM},
+            {"role": "user", "content": user}
+        ]
 
-        # Research task - push for depth and specifics
-        research_task = Task(
-            description=(
-                f"Conduct an in-depth analysis of {self.topic}. Your research must include:\n"
-                f"1. Background and context - what is this and why does it matter?\n"
-                f"2. Current state - what's happening right now? Include specific examples, companies, or projects.\n"
-                f"3. Key statistics and data points - numbers, percentages, growth rates.\n"
-                f"4. Major players and stakeholders - who's involved and what are they doing?\n"
-                f"5. Challenges and controversies - what are the problems or debates?\n"
-                f"6. Future outlook - where is this heading in the next 1-3 years?\n"
-                f"7. Expert opinions or notable quotes if available.\n\n"
-                f"Be specific. Use concrete examples, not vague statements. "
-                f"Focus on information from 2024-2026."
-            ),
-            expected_output=(
-                "A comprehensive research brief with 7+ distinct sections, "
-                "including specific examples, statistics, and detailed analysis. "
-                "At least 800 words of substantive content."
-            ),
-            agent=researcher
+    @staticmethod
+    def _format_brief(raw):
+        # Expand the researcher's compact JSON into the bullet brief the
+        # writer prompt expects; fall back to the raw text if it doesn't parse
+        try:
+            data = json.loads(raw)
+            lines = []
+            for section in data.get("sections", []):
+                lines.append(f"## {section.get('header', '')}")
+                lines.extend(f"- {b}" for b in section.get("bullets", []))
+                lines.extend(f"- STAT: {s}" for s in section.get("stats", []))
+            if lines:
+                return "\n".join(lines)
+        except (ValueError, TypeError, AttributeError):
+            pass
+        return raw
+
+    def _outline_messages(self):
+        # Independent of the research brief, so it can run concurrently with
+        # it - shares the writer persona so the two calls share a KV prefix
+        user = (
+            f"Draft a section outline for a comprehensive 800-1200 word article about "
+            f"{self.topic}. List 6-8 descriptive section headers (## style) with one "
+            f"sentence per section describing what it should cover. Output only the outline."
         )
+        return [
+            {"role": "system", "content": WRITER_SYSTEM},
+            {"role": "user", "content": user}
+        ]
 
-        # Writing task - maintain depth while improving readability
-        writing_task = Task(
-            description=(
-                f"Using the research provided, create a comprehensive article about {self.topic}. "
-                f"Requirements:\n"
-                f"1. Keep ALL the specific details, statistics, and examples from the research.\n"
-                f"2. Organize into clear sections with descriptive headers (use ## for headers).\n"
-                f"3. Start with a compelling introduction that frames why this matters.\n"
-                f"4. Use bullet points for lists of items or key points.\n"
-                f"5. Bold (**) important terms, statistics, or key findings.\n"
-                f"6. End with a forward-looking conclusion.\n"
-                f"7. Maintain an authoritative but accessible tone.\n\n"
-                f"Do NOT summarize or condense - preserve the depth of the research."
-            ),
-            expected_output=(
-                "A polished, publication-ready article in Markdown format. "
-                "Should be 800-1200 words with clear structure, preserved details, "
-                "and professional formatting."
-            ),
-            agent=writer
+    def _writer_messages(self, research, outline):
+        user = (
+            f"Using the research brief below, create a comprehensive article about {self.topic}. "
+            f"Requirements:\n"
+            f"1. Keep ALL the specific details, statistics, and examples from the research.\n"
+            f"2. Organize into clear sections with descriptive headers (use ## for headers).\n"
+            f"3. Start with a compelling introduction that frames why this matters.\n"
+            f"4. Use bullet points for lists of items or key points.\n"
+            f"5. Bold (**) important terms, statistics, or key findings.\n"
+            f"6. End with a forward-looking conclusion.\n"
+            f"7. Maintain an authoritative but accessible tone.\n\n"
+            f"The brief is deliberately terse - expand every bullet into full prose with "
+            f"the detail it implies, and do NOT drop any of its facts or numbers. "
+            f"The article should be 800-1200 words in Markdown format. "
+            f"Follow the prepared outline, adjusting it where the research warrants.\n\n"
+            f"--- OUTLINE ---\n{outline}\n\n"
+            f"--- RESEARCH BRIEF ---\n{research}"
         )
-        
-        # Put it all together and run in sequence
-        crew = Crew(
-            agents=[researcher, writer],
-            tasks=[research_task, writing_task],
-            process=Process.sequential,
-            verbose=True
+        return [
+            {"role": "system", "content": WRITER_SYSTEM},
+            {"role": "user", "content": user}
+        ]
+
+    async def _collect(self, messages, temperature=None, json_mode=False):
+        # Drain a completion stream into one string, no rendering
+        parts = []
+        stream = await self._completion(messages, temperature=temperature, json_mode=json_mode)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content or ""
+            if delta:
+                parts.append(delta)
+        return "".join(parts)
+
+    async def _write_report(self, research, outline, placeholder):
+        # Stream the writer's article into the live preview, throttled
+        buf = []
+        last_render = 0.0
+
+        stream = await self._completion(self._writer_messages(research, outline))
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            buf.append(delta)
+            now = time.monotonic()
+            if placeholder is not None and now - last_render >= RENDER_INTERVAL:
+                last_render = now
+                placeholder.markdown("".join(buf))
+
+        # Final flush - the throttle may have swallowed the last few updates,
+        # and renderers that parse asynchronously need a chance to settle
+        report = "".join(buf)
+        if placeholder is not None and report:
+            placeholder.markdown(report)
+            flush = getattr(placeholder, "flush", None)
+            if flush is not None:
+                flush()
+        return report
+
+    async def run_async(self, placeholder=None):
+        # One HTTP/2 client per run, installed as litellm's async session so
+        # all three completions skip per-call TCP+TLS setup and the two
+        # concurrent streams multiplex over a single connection
+        # Scoped to the run rather than module level because run() spins up a
+        # fresh event loop each call - a client whose connections belong to a
+        # closed loop would fail the next run with "Event loop is closed"
+        client = httpx.AsyncClient(
+            http2=True,
+            timeout=120,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
         )
+        litellm.aclient_session = client
+        try:
+            # Fire research and outline concurrently - the provider batches
+            # them - then merge both into the final article
+            # The researcher runs at temperature 0 - facts should be
+            # deterministic anyway, and a stable sampling config keeps its
+            # cache key stable
+            research, outline = await asyncio.gather(
+                self._collect(self._researcher_messages(), temperature=0, json_mode=True),
+                self._collect(self._outline_messages())
+            )
+            return await self._write_report(self._format_brief(research), outline, placeholder)
+        finally:
+            litellm.aclient_session = None
+            await client.aclose()
 
-        return crew.kickoff()
+    def run(self, placeholder=None):
+        # placeholder is an optional slot with a .markdown(text) method - when
+        # given, the article is pushed into it as it's generated so the user
+        # sees the report forming instead of staring at a spinner
+        return asyncio.run(self.run_async(placeholder=placeholder))
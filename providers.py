@@ -0,0 +1,44 @@
+# Provider selection for the Deep Research Agent
+# Cloud (Groq) when an API key is in Streamlit secrets, local Ollama otherwise
+# Lives in its own module so every entry point shares one copy of the model
+# tables instead of each duplicating the branch (and its imports)
+
+import os
+
+import streamlit as st
+
+
+def get_provider():
+    # Returns (env_mode, api_key, model_options)
+    if "GROQ_API_KEY" in st.secrets:
+        api_key = st.secrets["GROQ_API_KEY"]
+
+        # Set the env var so litellm can find it
+        os.environ["GROQ_API_KEY"] = api_key
+
+        # Current working Groq models (Jan 2026)
+        model_options = {
+            "groq/llama-3.3-70b-versatile": "Best Quality",
+            "groq/llama-3.1-8b-instant": "Fastest"
+        }
+        return "Cloud", api_key, model_options
+
+    # Ollama serializes requests by default, so the concurrent research and
+    # outline calls would silently queue behind a single slot
+    # These only take full effect if set before `ollama serve` starts, but
+    # setdefault makes sure we never override a user's own tuning
+    os.environ.setdefault("OLLAMA_NUM_PARALLEL", "4")
+    os.environ.setdefault("OLLAMA_MAX_LOADED_MODELS", "2")
+
+    # Ollama models with litellm prefix
+    # Explicit quantization tags where Ollama publishes them: decode is
+    # memory-bound, so int4 roughly doubles token/sec over fp16 while int8
+    # keeps a bit more quality - the bare tags pull whatever default the
+    # registry ships (usually q4_K_M, but not always)
+    model_options = {
+        "ollama/deepseek-r1:8b": "DeepSeek R1 8B",
+        "ollama/llama3.2:3b-instruct-q4_K_M": "Llama 3.2 (int4 - fastest)",
+        "ollama/llama3.2:3b-instruct-q8_0": "Llama 3.2 (int8 - balanced)",
+        "ollama/mistral": "Mistral"
+    }
+    return "Local", None, model_options
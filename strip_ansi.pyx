@@ -0,0 +1,48 @@
+# cython: language_level=3
+# Compiled twin of utils._strip_ansi - identical semantics, one C loop
+# Optional: build in place with `cythonize -3 -i strip_ansi.pyx`; utils.py
+# falls back to the pure-Python scanner when the extension is absent
+
+cpdef str strip_ansi(str s):
+    cdef Py_ssize_t n = len(s)
+    cdef Py_ssize_t i, pos, j, k, limit
+    cdef Py_UCS4 c
+    cdef bint matched
+    cdef list out
+
+    i = s.find('\x1b')
+    if i < 0:
+        return s
+
+    out = []
+    pos = 0
+    while i >= 0:
+        out.append(s[pos:i])
+        j = i + 1
+        matched = False
+        if j < n:
+            c = s[j]
+            if c == u'[':
+                # CSI: parameter bytes, intermediate bytes, one final byte,
+                # with the same {0,32}/{0,8} bounds as utils._ANSI_ESCAPE
+                k = j + 1
+                limit = k + 32
+                while k < n and k < limit and u'0' <= s[k] <= u'?':
+                    k += 1
+                limit = k + 8
+                while k < n and k < limit and u' ' <= s[k] <= u'/':
+                    k += 1
+                if k < n and u'@' <= s[k] <= u'~':
+                    j = k + 1
+                    matched = True
+            elif u'@' <= c <= u'_':
+                # Two-byte Fe escape
+                j += 1
+                matched = True
+        if not matched:
+            # Unterminated or unknown sequence - keep it
+            out.append(s[i:j])
+        pos = j
+        i = s.find('\x1b', pos)
+    out.append(s[pos:])
+    return ''.join(out)
@@ -1,6 +1,6 @@
 # test.py
 from crew import ResearchCrew
 
-crew = ResearchCrew("Artificial Intelligence in 2026")
+crew = ResearchCrew("Artificial Intelligence in 2026", "ollama/llama3.2")
 result = crew.run()
-print(result)
\ No newline at end of file
+print(result)
@@ -0,0 +1,101 @@
+# Incremental renderer for the streaming report
+# Re-parsing the whole markdown buffer on every update is quadratic in report
+# length, so we split the stream into completed blocks (rendered to HTML once
+# and cached) plus one trailing block that gets re-parsed each tick
+
+from concurrent.futures import ProcessPoolExecutor
+
+from markdown_it import MarkdownIt
+
+# Plain CommonMark plus tables, which the writer agent uses heavily
+_MD = MarkdownIt("commonmark").enable("table")
+
+# Trailing blocks bigger than this get parsed in a worker process so the
+# event loop stays free to accept SSE tokens; below it, the IPC round trip
+# costs more than the parse itself
+_OFFLOAD_THRESHOLD = 4096
+
+_MD_POOL = None
+
+
+def _pool():
+    # Lazy - importing this module shouldn't fork a worker nobody uses
+    global _MD_POOL
+    if _MD_POOL is None:
+        _MD_POOL = ProcessPoolExecutor(max_workers=1)
+    return _MD_POOL
+
+
+def md_to_html(text):
+    return _MD.render(text)
+
+
+def split_complete_blocks(text):
+    # Split the buffer into a stable prefix of finished blocks and the
+    # trailing block that's still being written
+    # A block boundary is a blank line outside a fenced code block - anything
+    # after the last boundary may still grow, so it stays in the tail
+    in_fence = False
+    last_boundary = 0
+    pos = 0
+
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and line.strip() == "":
+            last_boundary = pos + len(line)
+        pos += len(line)
+
+    return text[:last_boundary], text[last_boundary:]
+
+
+class StreamingMarkdown:
+    # Drop-in for a raw st.empty() slot - exposes .markdown(text) but renders
+    # through the block cache: finished blocks are parsed once, only the
+    # trailing block is re-parsed on each call
+    # Oversized trailing blocks parse in a worker process and land one tick
+    # late; flush() forces a synchronous render of the latest text
+
+    def __init__(self, slot):
+        self.slot = slot
+        self._stable_len = 0      # chars of the buffer already rendered
+        self._stable_html = ""    # cached HTML for those chars
+        self._latest = ""
+        self._pending = None      # in-flight worker parse of a big tail
+        self._pending_stable = ""
+
+    def markdown(self, text):
+        self._latest = text
+        stable, trailing = split_complete_blocks(text)
+
+        # Render only the newly-completed blocks and append to the cache
+        if len(stable) > self._stable_len:
+            self._stable_html += md_to_html(stable[self._stable_len:])
+            self._stable_len = len(stable)
+
+        if len(trailing) < _OFFLOAD_THRESHOLD:
+            # This synchronous render is fresher than any in-flight worker
+            # parse - drop the pending future so its superseded result can't
+            # ship later and roll the preview backward
+            self._pending = None
+            self.slot.html(self._stable_html + md_to_html(trailing))
+            return
+
+        # Big tail: show the previous worker result if it's ready, then hand
+        # the current tail to the worker - the render lags one tick but the
+        # stream loop never blocks on a long parse
+        if self._pending is None or self._pending.done():
+            if self._pending is not None:
+                self.slot.html(self._pending_stable + self._pending.result())
+            self._pending_stable = self._stable_html
+            self._pending = _pool().submit(md_to_html, trailing)
+
+    def flush(self):
+        # Called at stream end - drop any in-flight parse and render the
+        # latest text synchronously so the final view is never stale
+        self._pending = None
+        stable, trailing = split_complete_blocks(self._latest)
+        if len(stable) > self._stable_len:
+            self._stable_html += md_to_html(stable[self._stable_len:])
+            self._stable_len = len(stable)
+        self.slot.html(self._stable_html + md_to_html(trailing))
@@ -1,24 +1,305 @@
 # Utility helpers for the Deep Research Agent
 
+import atexit
+import queue
 import re
+import threading
+import time
+from collections import deque
+
 import streamlit as st
 
+# Minimum gap between container.code() re-renders (seconds, ~30 fps)
+# Agent chatter can arrive one write() per token; each render re-ships the
+# whole code block over the WebSocket, so bursts are coalesced into frames
+_RENDER_INTERVAL = 0.032
+
+# Size triggers that force a render inside the frame window, so a huge burst
+# can't pile up unboundedly behind the time throttle
+_RENDER_MAX_BYTES = 4096
+_RENDER_MAX_LINES = 8
+
+# Regex to match terminal color codes
+# Compiled once at import - a new capturer is built per Streamlit rerun, so
+# compiling in __init__ would redo this on every rerun
+# The CSI quantifiers are bounded (real sequences use a handful of parameter
+# and intermediate bytes) so adversarially long runs of parameter characters
+# can't push the engine into deep backtracking
+# Hex ranges keep the classes free of escaping quirks (0x5B '[' is carved
+# out of the Fe arm so CSI falls through to the second alternative), and
+# re.ASCII spares the engine its unicode-aware machinery - everything
+# matched is 7-bit
+_ANSI_ESCAPE = re.compile(
+    r'\x1B(?:[\x40-\x5A\x5C-\x5F]|\[[\x30-\x3F]{0,32}[\x20-\x2F]{0,8}[\x40-\x7E])',
+    re.ASCII
+)
+
+
+# Queue sentinel telling the drain worker to exit (see close())
+_CLOSE = object()
+
+# Stray control bytes (BEL, BS) show up as boxes in the code block but are
+# not escape sequences, so the ANSI scanner never removes them; a single
+# C-level translate pass drops them before any other work
+_CTRL_TABLE = {0x07: None, 0x08: None}
+
+# CSI byte classes for the scanner: 1 = parameter (0x30-0x3F),
+# 2 = intermediate (0x20-0x2F), 4 = final (0x40-0x7E), 0 = anything else
+# One indexed load replaces a pair of range compares per byte in the
+# sequence-skipping loops
+_CSI_CLASS = bytes(
+    1 if 0x30 <= b <= 0x3F else
+    2 if 0x20 <= b <= 0x2F else
+    4 if 0x40 <= b <= 0x7E else
+    0
+    for b in range(256)
+)
+
+
+def _strip_ansi(s):
+    # Hand-rolled replacement for _ANSI_ESCAPE.sub on the hot path: one
+    # forward scan that copies clean runs verbatim and hops over escape
+    # sequences by walking to their terminator, skipping regex setup entirely
+    # (_ANSI_ESCAPE stays as the reference definition of what gets stripped)
+    i = s.find('\x1b')
+    if i < 0:
+        return s
+
+    out = []
+    pos = 0
+    n = len(s)
+    while i >= 0:
+        out.append(s[pos:i])
+        j = i + 1
+        matched = False
+        if j < n:
+            c = s[j]
+            if c == '[':
+                # CSI: parameter bytes, intermediate bytes, one final byte,
+                # honoring the same {0,32}/{0,8} bounds as the regex so both
+                # leave the same degenerate sequences untouched
+                # (non-ASCII codepoints fall outside the table, class 0)
+                k = j + 1
+                limit = k + 32
+                while k < n and k < limit:
+                    b = ord(s[k])
+                    if b > 0x7E or _CSI_CLASS[b] != 1:
+                        break
+                    k += 1
+                limit = k + 8
+                while k < n and k < limit:
+                    b = ord(s[k])
+                    if b > 0x7E or _CSI_CLASS[b] != 2:
+                        break
+                    k += 1
+                if k < n:
+                    b = ord(s[k])
+                    if b <= 0x7E and _CSI_CLASS[b] == 4:
+                        j = k + 1
+                        matched = True
+            elif '@' <= c <= '_':
+                # Two-byte Fe escape
+                j += 1
+                matched = True
+        if not matched:
+            # Unterminated or unknown sequence - keep it, same as the regex
+            out.append(s[i:j])
+        pos = j
+        i = s.find('\x1b', pos)
+    out.append(s[pos:])
+    return ''.join(out)
+
+
+# Prefer the compiled scanner when it's been built (cythonize -3 -i
+# strip_ansi.pyx) - same semantics as the Python one, a fraction of the cost
+# per call on long escape-heavy lines
+try:
+    from strip_ansi import strip_ansi as _strip_ansi
+except ImportError:
+    pass
+
 
 class StreamToExpander:
     # Captures console output and shows it in a Streamlit code block
-    # Strips out ANSI color codes and keeps only the last 15 lines
-    
-    def __init__(self, container):
+    # Strips out ANSI color codes and keeps only the most recent lines
+
+    # Default window size; pass max_lines to trade WebSocket payload size
+    # against how much history stays on screen
+    MAX_LINES = 15
+
+    def __init__(self, container, max_lines=None):
         self.container = container
-        self.buffer = []
-        # Regex to match terminal color codes
-        self.ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+        # Render into one st.empty() placeholder carved out of the container
+        # Calling container.code() directly can append a new element per call
+        # depending on the container; a fixed slot keeps the DOM node stable
+        # so the frontend just patches its text
+        self.slot = container.empty() if hasattr(container, "empty") else container
+        # The visible window lives in one rolling byte buffer: lines are
+        # appended newline-terminated in place and the offsets deque remembers
+        # where each line starts and ends so eviction can trim the head
+        # One buffer instead of a ring of strings means no per-line string
+        # objects churning the allocator during long streaming sessions
+        self._buf = bytearray()
+        self._offsets = deque(maxlen=max_lines if max_lines is not None else self.MAX_LINES)
+        self._last_render = 0.0
+        self._dirty = False
+        self._last_payload = None
+        self._bytes_since_render = 0
+
+        # All stripping and rendering happens on a daemon worker, so the
+        # thread doing the logging never waits on regex work or the frontend
+        # The script-run context is attached so the worker may touch Streamlit
+        self._q = queue.Queue()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        try:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(self._thread)
+        except Exception:
+            pass
+        self._thread.start()
+
+        # Make teardown show the tail: aggressive throttling is only safe if
+        # whatever is still buffered gets rendered when the process winds down
+        atexit.register(self.flush)
 
     def write(self, data):
-        if data.strip():
-            clean_text = self.ansi_escape.sub('', data)
-            self.buffer.append(clean_text)
-            self.container.code("\n".join(self.buffer[-15:]), language="text")
+        # Producer side is just an enqueue
+        self._q.put_nowait(data)
+
+    def _drain(self):
+        while True:
+            chunks = [self._q.get()]
+            # Batch whatever else piled up so a burst costs one pass
+            try:
+                while True:
+                    chunks.append(self._q.get_nowait())
+            except queue.Empty:
+                pass
+            closing = any(chunk is _CLOSE for chunk in chunks)
+            try:
+                self._process("".join(c for c in chunks if c is not _CLOSE))
+            except Exception:
+                # The slot can outlive its script run (instances are reused
+                # across reruns), making the render call fail; drop the batch
+                # and keep draining so write() and flush() never back up
+                # behind a dead worker
+                pass
+            finally:
+                for _ in chunks:
+                    self._q.task_done()
+            if closing:
+                return
+
+    def _process(self, data):
+        # Drop bells and backspaces before anything else looks at the text
+        data = data.translate(_CTRL_TABLE)
+
+        # Split multi-line chunks up front so a 50-line agent dump costs one
+        # render, not 50, and print()'s lone-newline second call is a no-op
+        lines = [line for line in data.split('\n') if line.strip()]
+        if not lines:
+            return
+
+        # Most log lines carry no escape codes at all - a C-level substring
+        # check is far cheaper than scanning a clean string
+        # (ESC is itself an ASCII byte, so str.isascii() can't stand in as a
+        # cheaper guard here)
+        if '\x1b' in data:
+            lines = [_strip_ansi(line) for line in lines]
+        for line in lines:
+            self._append_line(line)
+
+        # Buffer always, render at most once per frame - unless the window
+        # just gained enough text that waiting out the frame would let the
+        # backlog grow unbounded
+        self._bytes_since_render += sum(len(line) + 1 for line in lines)
+        now = time.monotonic()
+        if (now - self._last_render >= _RENDER_INTERVAL
+                or self._bytes_since_render >= _RENDER_MAX_BYTES
+                or len(lines) >= _RENDER_MAX_LINES):
+            self._render(now)
+        else:
+            self._dirty = True
+
+    def _append_line(self, line):
+        # When the window is full, drop the oldest line: trim the head of the
+        # byte buffer and rebase the surviving offsets
+        if len(self._offsets) == self._offsets.maxlen:
+            cut = self._offsets.popleft()[1]
+            del self._buf[:cut]
+            self._offsets = deque(
+                ((start - cut, end - cut) for start, end in self._offsets),
+                maxlen=self._offsets.maxlen
+            )
+        start = len(self._buf)
+        self._buf.extend(line.encode('utf-8'))
+        self._buf.extend(b'\n')
+        self._offsets.append((start, len(self._buf)))
+
+    def _render(self, now):
+        self._last_render = now
+        self._dirty = False
+        self._bytes_since_render = 0
+
+        # Spinners and progress bars re-emit identical text; when the visible
+        # window hasn't actually changed, skip the WebSocket round trip -
+        # the compare is a C-level memcmp, done on the bytes so the decode
+        # only happens for frames that really ship
+        payload = bytes(self._buf)
+        if payload == self._last_payload:
+            return
+        self._last_payload = payload
+        self.slot.code(payload.decode('utf-8', 'replace'), language="text")
 
     def flush(self):
-        pass
+        # Wait for the worker to catch up - bounded, because this runs from
+        # atexit and an untimed join on a wedged worker would hang
+        # interpreter shutdown - then push out anything the throttle held
+        deadline = time.monotonic() + 1.0
+        while self._q.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        if self._dirty:
+            self._render(time.monotonic())
+
+    def rebind(self, container):
+        # Point the capturer at this rerun's container - the old slot died
+        # with its script run - and repaint the current window into it
+        self.container = container
+        self.slot = container.empty() if hasattr(container, "empty") else container
+        self._last_payload = None
+        if self._offsets:
+            self._render(time.monotonic())
+
+    def close(self):
+        # Retire the capturer: drop the atexit hook that pins it alive, push
+        # out whatever is buffered, and stop the worker via the sentinel
+        atexit.unregister(self.flush)
+        self.flush()
+        self._q.put_nowait(_CLOSE)
+
+
+def get_expander(container, key="log", max_lines=None):
+    # One capturer per stable key per session
+    # Streamlit reruns the script top to bottom on every interaction, and a
+    # bare constructor call there would build a fresh buffer, atexit hook and
+    # worker thread each time; reusing the session's instance avoids that
+    # churn and keeps the visible history across reruns
+    # Keyed on a caller-supplied name because container objects are rebuilt
+    # every rerun - their ids never match across reruns and a recycled id
+    # could falsely match - so the surviving instance is instead re-pointed
+    # at the fresh container on each lookup
+    state_key = f"_ste_{key}"
+    expander = st.session_state.get(state_key)
+
+    # A changed window size means a genuinely new capturer; shut the old one
+    # down so its worker and atexit hook don't linger
+    if expander is not None and max_lines is not None and expander._offsets.maxlen != max_lines:
+        expander.close()
+        expander = None
+
+    if expander is None:
+        expander = StreamToExpander(container, max_lines)
+        st.session_state[state_key] = expander
+    else:
+        expander.rebind(container)
+    return expander